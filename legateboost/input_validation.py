@@ -47,7 +47,13 @@ def check_array(x: Any) -> cn.ndarray:
     if cn.iscomplexobj(x):
         raise ValueError("Complex data not supported.")
     # note: taking sum first then checking finiteness uses less memory
-    if np.issubdtype(x.dtype, np.floating) and not cn.isfinite(x.sum()):
+    # the sum can overflow for large finite values, so confirm with an
+    # elementwise check before raising
+    if (
+        np.issubdtype(x.dtype, np.floating)
+        and not cn.isfinite(x.sum())
+        and not cn.isfinite(x).all()
+    ):
         raise ValueError("Input contains NaN or inf")
 
     x = cn.array(x, copy=False)
@@ -57,25 +63,31 @@ def check_array(x: Any) -> cn.ndarray:
 
 def check_X_y(X: Any, y: Any = None) -> Any:
     X = check_array(X)
-    if len(X.shape) != 2:
+    # read the metadata once
+    X_shape = X.shape
+    if len(X_shape) != 2:
         raise ValueError("X must be 2-dimensional. Reshape your data.")
-    if X.shape[0] == 0:
+    if X_shape[0] == 0:
         raise ValueError("Empty input")
-    if X.shape[1] == 0:
+    if X_shape[1] == 0:
         raise ValueError(
             "0 feature(s) (shape=({}, 0)) while a minimum of 1 is required.".format(
-                X.shape[0]
+                X_shape[0]
             )
         )
 
     if y is not None:
         y = check_array(y)
-        y = y.astype(cn.float64)
+        # float32 labels are converted too, as label-only computations such
+        # as the initial prediction would otherwise run in float32.
+        # astype always copies, only convert when needed
+        if y.dtype != cn.float64:
+            y = y.astype(cn.float64)
         y = cn.atleast_1d(y)
 
         if y.ndim == 1:
             y = y[:, cn.newaxis]
-        if y.shape[0] != X.shape[0]:
+        if y.shape[0] != X_shape[0]:
             raise ValueError("Number of labels does not match number of samples.")
 
     if np.issubdtype(X.dtype, np.integer):
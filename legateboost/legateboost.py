@@ -14,7 +14,9 @@ import cunumeric as cn
 
 from .input_validation import check_sample_weight, check_X_y
 from .metrics import BaseMetric, metrics
-from .models import BaseModel, Tree
+from .models import BaseModel, Linear, Tree
+from .models.linear import predict_linear_models
+from .models.tree import TreeBatch
 from .objectives import BaseObjective, objectives
 from .shapley import global_shapley_attributions, local_shapley_attributions
 from .utils import PickleCunumericMixin, preround
@@ -54,6 +56,17 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
             raise ValueError("base_models must be a tuple")
         self.base_models = base_models
 
+    def __getstate__(self) -> dict[str, Any]:
+        state = super().__getstate__()
+        # derived from models_, rebuilt on demand
+        state.pop("_tree_batch", None)
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        super().__setstate__(state)
+        if hasattr(self, "models_"):
+            self._batch_trees()
+
     def _more_tags(self) -> Any:
         return {
             "_xfail_checks": {
@@ -87,7 +100,7 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
     def _compute_metrics(
         self,
         iteration: int,
-        pred: cn.ndarray,
+        transformed_pred: cn.ndarray,
         eval_preds: List[cn.ndarray],
         y: cn.ndarray,
         sample_weight: cn.ndarray,
@@ -110,20 +123,20 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
             name: str,
         ) -> None:
             eval_result[name][metric.name()].append(
-                metric.metric(
-                    y, self._objective_instance.transform(metric_pred), sample_weight
-                )
+                metric.metric(y, metric_pred, sample_weight)
             )
 
         # add the training metrics
         for metric in metrics:
-            add_metric(pred, y, sample_weight, metric, "train")
+            add_metric(transformed_pred, y, sample_weight, metric, "train")
 
         # add any eval metrics, if they exist
         for i, (X_eval, y_eval, sample_weight_eval) in enumerate(eval_set):
+            # transform once for all metrics
+            transformed_eval_pred = self._transform(eval_preds[i])
             for metric in metrics:
                 add_metric(
-                    eval_preds[i],
+                    transformed_eval_pred,
                     y_eval,
                     sample_weight_eval,
                     metric,
@@ -161,24 +174,36 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
 
         return new_eval_set
 
+    def _subsample_generator(self) -> Optional[cn.random.Generator]:
+        """Creates the generator used to draw subsample masks, or None if
+        subsampling is disabled.
+
+        Create one per training run rather than one per iteration.
+        """
+        if self.subsample >= 1.0:
+            return None
+        return cn.random.Generator(
+            cn.random.XORWOW(seed=self.random_state_.randint(0, 2**32))
+        )
+
     def _get_weighted_gradient(
         self,
         y: cn.ndarray,
-        pred: cn.ndarray,
-        sample_weight: cn.ndarray,
+        transformed_pred: cn.ndarray,
+        sample_weight: Optional[cn.ndarray],
         learning_rate: float,
+        subsample_generator: Optional[cn.random.Generator] = None,
     ) -> Tuple[cn.ndarray, cn.ndarray]:
-        """Computes the weighted gradient and Hessian for the given predictions
-        and labels.
+        """Computes the weighted gradient and Hessian for the given
+        (transformed) predictions and labels. A sample_weight of None means
+        all weights are one and skips the weighting.
 
         Also applies a pre-rounding step to ensure reproducible floating
         point summation.
         """
         # check input dimensions are consistent
-        assert y.ndim == pred.ndim == 2, (y.shape, pred.shape)
-        g, h = self._objective_instance.gradient(
-            y, self._objective_instance.transform(pred)
-        )
+        assert y.ndim == 2, y.shape
+        g, h = self._objective_instance.gradient(y, transformed_pred)
 
         assert g.ndim == h.ndim == 2
         assert g.dtype == h.dtype == cn.float64, "g.dtype={}, h.dtype={}".format(
@@ -187,16 +212,20 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         assert g.shape == h.shape
 
         # apply weights and learning rate
-        g = g * sample_weight[:, None] * learning_rate
         # ensure hessians are not too small for numerical stability
-        h = cn.maximum(h * sample_weight[:, None], 1e-8)
+        if sample_weight is None:
+            g = g * learning_rate
+            h = cn.maximum(h, 1e-8)
+        else:
+            # scale the weight vector first so that g is only traversed once
+            g = g * (sample_weight * learning_rate)[:, None]
+            # h is our own copy at this point, clamp it in place
+            h = h * sample_weight[:, None]
+            cn.maximum(h, 1e-8, out=h)
 
         # apply subsample
-        if self.subsample < 1.0:
-            generator = cn.random.Generator(
-                cn.random.XORWOW(seed=self.random_state_.randint(0, 2**32))
-            )
-            mask = generator.binomial(1, self.subsample, size=y.shape[0])
+        if subsample_generator is not None:
+            mask = subsample_generator.binomial(1, self.subsample, size=y.shape[0])
             g *= mask[:, None]
             h *= mask[:, None]
 
@@ -213,6 +242,7 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         # check inputs
         X, y = check_X_y(X, y)
         _eval_set = self._process_eval_set(eval_set)
+        unit_weights = sample_weight is None
         sample_weight = check_sample_weight(sample_weight, y.shape[0])
 
         if self.n_features_in_ != X.shape[1]:
@@ -228,6 +258,10 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         # current model prediction
         train_pred = self._predict(X)
         eval_preds = [self._predict(X_eval) for X_eval, _, _ in _eval_set]
+        # shared by the gradient and the metrics
+        transformed_train_pred = self._transform(train_pred)
+
+        subsample_generator = self._subsample_generator()
 
         # callbacks before training
         for c in self.callbacks:
@@ -241,7 +275,11 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
 
             # obtain gradients
             g, h = self._get_weighted_gradient(
-                y, train_pred, sample_weight, self.learning_rate
+                y,
+                transformed_train_pred,
+                None if unit_weights else sample_weight,
+                self.learning_rate,
+                subsample_generator,
             )
 
             # build new model
@@ -253,6 +291,9 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
 
             # update current predictions
             train_pred += self.models_[-1].predict(X)
+            # an identity transform shares train_pred, already updated in place
+            if not self._objective_instance.is_identity_transform:
+                transformed_train_pred = self._objective_instance.transform(train_pred)
             for i, (X_eval, _, _) in enumerate(_eval_set):
                 eval_preds[i] += self.models_[-1].predict(X_eval)
 
@@ -260,7 +301,7 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
             model_idx = len(self.models_) - 1
             self._compute_metrics(
                 model_idx,
-                train_pred,
+                transformed_train_pred,
                 eval_preds,
                 y,
                 sample_weight,
@@ -283,6 +324,7 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         for c in self.callbacks:
             c.after_training(self)
 
+        self._batch_trees()
         return self
 
     def update(
@@ -320,6 +362,7 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         X, y = check_X_y(X, y)
         _eval_set = self._process_eval_set(eval_set)
 
+        unit_weights = sample_weight is None
         sample_weight = check_sample_weight(sample_weight, y.shape[0])
 
         assert hasattr(self, "is_fitted_") and self.is_fitted_
@@ -342,26 +385,36 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         for m in self.models_:
             m.clear()
 
-        # current model prediction
-        train_pred = self._predict(X)
-        eval_preds = [self._predict(X_eval) for X_eval, _, _ in _eval_set]
+        # current model prediction, every model predicts zero after clear()
+        train_pred = self._predict_init(X)
+        eval_preds = [self._predict_init(X_eval) for X_eval, _, _ in _eval_set]
+        # shared by the gradient and the metrics
+        transformed_train_pred = self._transform(train_pred)
 
+        subsample_generator = self._subsample_generator()
         for i, m in enumerate(self.models_):
             # obtain gradients
             g, h = self._get_weighted_gradient(
-                y, train_pred, sample_weight, self.learning_rate
+                y,
+                transformed_train_pred,
+                None if unit_weights else sample_weight,
+                self.learning_rate,
+                subsample_generator,
             )
 
             m.update(X, g, h)
 
             train_pred += m.predict(X)
+            # an identity transform shares train_pred, already updated in place
+            if not self._objective_instance.is_identity_transform:
+                transformed_train_pred = self._objective_instance.transform(train_pred)
             for i, (X_eval, _, _) in enumerate(_eval_set):
                 eval_preds[i] += self.models_[-1].predict(X_eval)
 
             # evaluate our progress
             self._compute_metrics(
                 i,
-                train_pred,
+                transformed_train_pred,
                 eval_preds,
                 y,
                 sample_weight,
@@ -370,6 +423,7 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
                 _eval_set,
                 eval_result,
             )
+        self._batch_trees()
         return self
 
     def fit(
@@ -400,7 +454,7 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         self :
             Returns self.
         """
-        sample_weight = check_sample_weight(sample_weight, len(y))
+        checked_sample_weight = check_sample_weight(sample_weight, len(y))
         self.n_features_in_ = X.shape[1]
         self.models_: List[BaseModel] = []
         # initialise random state if an integer was passed
@@ -419,10 +473,11 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
         self._metrics = self._setup_metrics()
 
         self.model_init_ = self._objective_instance.initialise_prediction(
-            y, sample_weight, self.init == "average"
+            y, checked_sample_weight, self.init == "average"
         )
         self.is_fitted_ = True
 
+        # pass the original weights on, so unit weights can be detected
         return self._partial_fit(X, y, sample_weight, eval_set, eval_result)
 
     def _predict(self, X: cn.ndarray) -> cn.ndarray:
@@ -433,12 +488,50 @@ class LBBase(BaseEstimator, PickleCunumericMixin):
                     X.shape[1], self.n_features_in_
                 )
             )
+        # all trees are predicted by a single task, which also adds model_init_
+        tree_batch = self._batch_trees()
+        if tree_batch is not None:
+            pred = tree_batch.predict(X, self.model_init_)
+        else:
+            pred = self._predict_init(X)
+        # likewise all linear models are predicted by a single product
+        linear_models = [m for m in self.models_ if isinstance(m, Linear)]
+        if linear_models:
+            pred += predict_linear_models(linear_models, X)
+        for m in self.models_:
+            if not isinstance(m, (Tree, Linear)):
+                pred += m.predict(X)
+        return pred
+
+    def _predict_init(self, X: cn.ndarray) -> cn.ndarray:
         pred = cn.empty((X.shape[0],) + self.model_init_.shape, dtype=cn.float64)
         pred[:] = self.model_init_
-        for m in self.models_:
-            pred += m.predict(X)
         return pred
 
+    def _transform(self, pred: cn.ndarray) -> cn.ndarray:
+        if self._objective_instance.is_identity_transform:
+            return pred
+        return self._objective_instance.transform(pred)
+
+    def _batch_trees(self) -> Optional[TreeBatch]:
+        """Returns a TreeBatch of the trees in the ensemble, reusing the
+        storage of the previous batch so that only trees added since are
+        copied.
+
+        The batch is kept for later calls, including a new batch built when
+        the trees outgrow the storage of the previous one.
+        """
+        trees = [m for m in self.models_ if isinstance(m, Tree)]
+        if not trees:
+            return None
+        tree_batch = getattr(self, "_tree_batch", None)
+        if tree_batch is None:
+            tree_batch = TreeBatch(trees)
+        else:
+            tree_batch = tree_batch.update(trees)
+        self._tree_batch = tree_batch
+        return tree_batch
+
     def dump_models(self) -> str:
         check_is_fitted(self, "is_fitted_")
         text = "init={}\n".format(self.model_init_)
@@ -723,7 +816,7 @@ class LBRegressor(LBBase, RegressorMixin):
         """
         X = check_X_y(X)
         check_is_fitted(self, "is_fitted_")
-        pred = self._objective_instance.transform(super()._predict(X))
+        pred = self._transform(super()._predict(X))
         if pred.shape[1] == 1:
             pred = pred.squeeze(axis=1)
         return pred
@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Sequence, Tuple
 
 import cunumeric as cn
 
@@ -122,3 +122,15 @@ class Linear(BaseModel):
         if not isinstance(other, Linear):
             raise NotImplementedError()
         return (other.betas_ == self.betas_).all()
+
+
+def predict_linear_models(models: Sequence[Linear], X: cn.ndarray) -> cn.ndarray:
+    """Sum of the predictions of linear models.
+
+    Linear models are additive in their coefficients, so the sum is
+    computed with a single matrix product over the summed coefficients.
+    """
+    betas = models[0].betas_.copy()
+    for m in models[1:]:
+        betas += m.betas_
+    return betas[0] + X.dot(betas[1:].astype(X.dtype))
@@ -1,12 +1,14 @@
 import math
 from enum import IntEnum
-from typing import Any
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 import cunumeric as cn
-from legate.core import TaskTarget, get_legate_runtime, types
+from legate.core import LogicalStore, TaskTarget, get_legate_runtime, types
 
 from ..library import user_context, user_lib
-from ..utils import gather, get_store
+from ..utils import get_store
 from .base_model import BaseModel
 
 
@@ -16,6 +18,57 @@ class LegateBoostOpCode(IntEnum):
     UPDATE_TREE = user_lib.cffi.UPDATE_TREE
 
 
+def predict_trees(
+    X: cn.ndarray,
+    leaf_value: LogicalStore,
+    feature: LogicalStore,
+    split_value: LogicalStore,
+    max_depth: int,
+    init: Optional[cn.ndarray] = None,
+) -> cn.ndarray:
+    """Sum the predictions of a stack of trees using a single task.
+
+    The tree stores have a leading dimension indexing the tree, with
+    shapes (n_trees, max_nodes, n_outputs) for the leaf values and
+    (n_trees, max_nodes) for the features and split values. If given,
+    `init` of shape (n_outputs,) is added to every prediction.
+    """
+    n_rows = X.shape[0]
+    n_features = X.shape[1]
+    n_outputs = leaf_value.shape[2]
+    task = get_legate_runtime().create_auto_task(
+        user_context, LegateBoostOpCode.PREDICT
+    )
+
+    task.add_scalar_arg(max_depth, types.int32)
+
+    pred = get_legate_runtime().create_store(types.float64, (n_rows, n_outputs))
+    X_ = get_store(X).promote(2, n_outputs)
+    pred_ = get_store(pred).promote(1, n_features)
+    task.add_input(X_)
+    task.add_broadcast(X_, 1)
+
+    # broadcast the tree structure
+    task.add_input(leaf_value)
+    task.add_input(feature)
+    task.add_input(split_value)
+    task.add_broadcast(leaf_value)
+    task.add_broadcast(feature)
+    task.add_broadcast(split_value)
+    # init is tiny, pass it by value rather than as another broadcast store
+    if init is not None:
+        task.add_scalar_arg(
+            tuple(float(v) for v in np.asarray(init).ravel()), (types.float64,)
+        )
+
+    task.add_output(pred_)
+
+    task.add_alignment(X_, pred_)
+    task.execute()
+
+    return cn.array(pred, copy=False)
+
+
 class Tree(BaseModel):
     """Decision tree model for gradient boosting.
 
@@ -72,13 +125,11 @@ class Tree(BaseModel):
         g: cn.ndarray,
         h: cn.ndarray,
     ) -> "Tree":
-        # dont let legate create a future - make sure at least 2 sample rows
+        # split candidates are the values of X at these rows, gathered and
+        # sorted inside the task so only the row indices are sent to workers
         sample_rows_np = self.random_state.randint(
             0, X.shape[0], max(2, self.split_samples)
         )
-        split_proposals = gather(X, tuple(sample_rows_np))
-        split_proposals.sort(axis=0)
-        split_proposals = split_proposals.T
 
         num_outputs = g.shape[1]
 
@@ -95,6 +146,7 @@ class Tree(BaseModel):
         max_nodes = 2 ** (self.max_depth + 1)
         task.add_scalar_arg(max_nodes, types.int32)
         task.add_scalar_arg(self.alpha, types.float64)
+        task.add_scalar_arg(tuple(int(r) for r in sample_rows_np), (types.int64,))
 
         task.add_input(X_)
         task.add_broadcast(X_, 1)
@@ -102,8 +154,6 @@ class Tree(BaseModel):
         task.add_input(h_)
         task.add_alignment(g_, h_)
         task.add_alignment(g_, X_)
-        task.add_input(get_store(split_proposals))
-        task.add_broadcast(get_store(split_proposals))
 
         # outputs
         leaf_value = get_legate_runtime().create_store(
@@ -140,8 +190,10 @@ class Tree(BaseModel):
         return self
 
     def clear(self) -> None:
-        self.leaf_value.fill(0)
-        self.hessian.fill(0)
+        # replace rather than fill in place, a TreeBatch built from this tree
+        # detects the change by identity
+        self.leaf_value = cn.zeros_like(self.leaf_value)
+        self.hessian = cn.zeros_like(self.hessian)
 
     def update(
         self,
@@ -187,37 +239,24 @@ class Tree(BaseModel):
         self.hessian = cn.array(hessian, copy=False)
         return self
 
-    def predict(self, X: cn.ndarray) -> cn.ndarray:
-        n_rows = X.shape[0]
-        n_features = X.shape[1]
-        n_outputs = self.leaf_value.shape[1]
-        task = get_legate_runtime().create_auto_task(
-            user_context, LegateBoostOpCode.PREDICT
-        )
-
-        pred = get_legate_runtime().create_store(types.float64, (n_rows, n_outputs))
-        X_ = get_store(X).promote(2, n_outputs)
-        pred_ = get_store(pred).promote(1, n_features)
-        task.add_input(X_)
-        task.add_broadcast(X_, 1)
-
-        # broadcast the tree structure
-        leaf_value_ = get_store(self.leaf_value)
-        feature_ = get_store(self.feature)
-        split_value_ = get_store(self.split_value)
-        task.add_input(leaf_value_)
-        task.add_input(feature_)
-        task.add_input(split_value_)
-        task.add_broadcast(leaf_value_)
-        task.add_broadcast(feature_)
-        task.add_broadcast(split_value_)
-
-        task.add_output(pred_)
-
-        task.add_alignment(X_, pred_)
-        task.execute()
+    def __getstate__(self) -> dict[str, Any]:
+        state = super().__getstate__()
+        # stores cannot be pickled, rebuilt on demand
+        state.pop("_stores", None)
+        return state
+
+    def _predict_stores(self) -> Tuple[LogicalStore, LogicalStore, LogicalStore]:
+        # The tree arrays as a stack of one tree. Cached until fit, update or
+        # clear replace the arrays.
+        arrays = (self.leaf_value, self.feature, self.split_value)
+        cached = getattr(self, "_stores", None)
+        if cached is None or any(a is not b for a, b in zip(arrays, cached[0])):
+            cached = (arrays, tuple(get_store(a).promote(0, 1) for a in arrays))
+            self._stores = cached
+        return cached[1]
 
-        return cn.array(pred, copy=False)
+    def predict(self, X: cn.ndarray) -> cn.ndarray:
+        return predict_trees(X, *self._predict_stores(), self.max_depth)
 
     def is_leaf(self, id: int) -> Any:
         return self.feature[id] == -1
@@ -229,33 +268,210 @@ class Tree(BaseModel):
         return id * 2 + 2
 
     def __str__(self) -> str:
-        def format_vector(v: cn.ndarray) -> str:
-            if cn.isscalar(v):
+        # fetch each array once rather than indexing cunumeric arrays per node
+        leaf_value = np.asarray(self.leaf_value)
+        feature = np.asarray(self.feature)
+        split_value = np.asarray(self.split_value)
+        gain = np.asarray(self.gain)
+        hessian = np.asarray(self.hessian)
+
+        def format_vector(v: np.ndarray) -> str:
+            if np.isscalar(v):
                 return "{:0.4f}".format(v)
             return "[" + ",".join(["{:0.4f}".format(x) for x in v]) + "]"
 
-        def recurse_print(id: int, depth: int) -> str:
-            if self.is_leaf(id):
-                text = "\t" * depth + "{}:leaf={},hess={}\n".format(
-                    id,
-                    format_vector(self.leaf_value[id]),
-                    format_vector(self.hessian[id]),
+        # depth first, left child before right child
+        lines = []
+        stack = [(0, 0)]
+        while stack:
+            id, depth = stack.pop()
+            if feature[id] == -1:
+                lines.append(
+                    "\t" * depth
+                    + "{}:leaf={},hess={}\n".format(
+                        id,
+                        format_vector(leaf_value[id]),
+                        format_vector(hessian[id]),
+                    )
                 )
             else:
-                text = (
+                lines.append(
                     "\t" * depth
                     + "{}:[f{}<={:0.4f}] yes={},no={},gain={:0.4f},hess={}\n".format(
                         id,
-                        self.feature[id],
-                        self.split_value[id],
+                        feature[id],
+                        split_value[id],
                         self.left_child(id),
                         self.right_child(id),
-                        self.gain[id],
-                        self.hessian[id],
+                        gain[id],
+                        hessian[id],
                     )
                 )
-                text += recurse_print(self.left_child(id), depth + 1)
-                text += recurse_print(self.right_child(id), depth + 1)
-            return text
+                stack.append((self.right_child(id), depth + 1))
+                stack.append((self.left_child(id), depth + 1))
+        return "".join(lines)
+
+
+class TreeBatch:
+    """Contiguous storage for a sequence of trees, so that the sum of their
+    predictions can be computed by a single task.
+
+    Trees of different depths are padded to the size of the largest tree.
+    Storage is preallocated for `capacity` trees so that trees added to the
+    ensemble later (e.g. by `partial_fit`) are copied in without reallocating
+    or copying the trees already in the batch. References to the arrays of
+    the source trees are kept so that a batch can detect when its trees have
+    been refit or updated. On machines without GPUs, small inputs are
+    predicted on the host with numpy, where launching a task would cost more
+    than the traversal itself.
+
+    Parameters
+    ----------
+    trees :
+        The trees to batch. Must have the same number of outputs.
+    capacity :
+        Number of trees to allocate storage for. Defaults to ``len(trees)``.
+    """
+
+    # limit on both rows * trees and rows * features (the elements of X read
+    # on the host) for prediction on the host with numpy
+    host_predict_size = 2**14
+
+    def __init__(self, trees: Sequence[Tree], capacity: Optional[int] = None) -> None:
+        assert len(trees) > 0
+        capacity = max(len(trees), capacity or 0)
+        max_nodes = max(t.feature.shape[0] for t in trees)
+        n_outputs = trees[0].leaf_value.shape[1]
+        self.max_depth = 0
+        self._host: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._stores: Optional[Tuple[LogicalStore, LogicalStore, LogicalStore]] = None
+        self._sources: List[Tuple[cn.ndarray, cn.ndarray, cn.ndarray]] = []
+        self._leaf_value = cn.zeros((capacity, max_nodes, n_outputs))
+        self._feature = cn.full((capacity, max_nodes), -1, dtype=cn.int32)
+        self._split_value = cn.zeros((capacity, max_nodes))
+        self._append(trees)
+
+    @property
+    def leaf_value(self) -> cn.ndarray:
+        return self._leaf_value[: len(self._sources)]
+
+    @property
+    def feature(self) -> cn.ndarray:
+        return self._feature[: len(self._sources)]
+
+    @property
+    def split_value(self) -> cn.ndarray:
+        return self._split_value[: len(self._sources)]
+
+    def _append(self, trees: Sequence[Tree]) -> None:
+        self._host = None
+        self._stores = None
+        for t in trees:
+            i = len(self._sources)
+            # nodes past the end of a tree are never reached, so a slot
+            # previously used by a truncated tree does not need to be reset
+            n_nodes = t.feature.shape[0]
+            self._leaf_value[i, :n_nodes] = t.leaf_value
+            self._feature[i, :n_nodes] = t.feature
+            self._split_value[i, :n_nodes] = t.split_value
+            self._sources.append((t.leaf_value, t.feature, t.split_value))
+            self.max_depth = max(self.max_depth, t.max_depth)
+
+    def _num_matching(self, trees: Sequence[Tree]) -> int:
+        # number of leading trees whose current state is held by the batch
+        n = 0
+        for t, (leaf_value, feature, split_value) in zip(trees, self._sources):
+            if not (
+                t.leaf_value is leaf_value
+                and t.feature is feature
+                and t.split_value is split_value
+            ):
+                break
+            n += 1
+        return n
+
+    def matches(self, trees: Sequence[Tree]) -> bool:
+        """Returns True if the batch holds exactly the current state of
+        `trees`."""
+        return len(trees) == len(self._sources) == self._num_matching(trees)
+
+    def update(self, trees: Sequence[Tree]) -> "TreeBatch":
+        """Returns a batch holding the current state of `trees`.
+
+        Trees shared with the front of this batch are kept in place, trees
+        that kept their structure (e.g. after `clear` or `update`) only have
+        their leaf values copied, the remaining trees are copied into the
+        preallocated storage. A new batch with twice the capacity is built if
+        the trees do not fit.
+        """
+        n = self._num_matching(trees)
+        if n == len(trees) == len(self._sources):
+            return self
+        capacity, max_nodes, n_outputs = self._leaf_value.shape
+        new_trees = trees[n:]
+        if (
+            len(trees) > capacity
+            or any(t.feature.shape[0] > max_nodes for t in new_trees)
+            or any(t.leaf_value.shape[1] != n_outputs for t in new_trees)
+        ):
+            return TreeBatch(trees, capacity=2 * len(trees))
+        while n < min(len(trees), len(self._sources)):
+            t = trees[n]
+            _, feature, split_value = self._sources[n]
+            if not (t.feature is feature and t.split_value is split_value):
+                break
+            self._leaf_value[n, : feature.shape[0]] = t.leaf_value
+            self._sources[n] = (t.leaf_value, t.feature, t.split_value)
+            n += 1
+        del self._sources[n:]
+        self.max_depth = max((t.max_depth for t in trees[:n]), default=0)
+        self._append(new_trees)
+        return self
 
-        return recurse_print(0, 0)
+    def _use_host(self, X: cn.ndarray) -> bool:
+        # X on a GPU would have to be copied to the host
+        if get_legate_runtime().machine.count(TaskTarget.GPU) > 0:
+            return False
+        n_rows, n_features = X.shape
+        work = max(n_rows * len(self._sources), n_rows * n_features)
+        return work <= self.host_predict_size
+
+    def _predict_host(
+        self, X: cn.ndarray, init: Optional[cn.ndarray] = None
+    ) -> cn.ndarray:
+        # Perform this computation using numpy to avoid Legate overhead
+        # Traversal is the same as the PREDICT task, over all trees at once
+        if self._host is None:
+            self._host = (
+                np.asarray(self.leaf_value),
+                np.asarray(self.feature),
+                np.asarray(self.split_value),
+            )
+        leaf_value, feature, split_value = self._host
+        X_np = np.asarray(X)
+        tree = np.arange(feature.shape[0])[:, None]
+        row = np.arange(X_np.shape[0])[None, :]
+        pos = np.zeros((feature.shape[0], X_np.shape[0]), dtype=np.int64)
+        for _ in range(self.max_depth):
+            f = feature[tree, pos]
+            leaf = f == -1
+            x = X_np[row, np.where(leaf, 0, f)]
+            child = pos * 2 + 1 + ~(x <= split_value[tree, pos])
+            pos = np.where(leaf, pos, child)
+        pred = leaf_value[tree, pos].sum(axis=0)
+        if init is not None:
+            pred += np.asarray(init)
+        return cn.array(pred)
+
+    def predict(self, X: cn.ndarray, init: Optional[cn.ndarray] = None) -> cn.ndarray:
+        """Sum of the predictions of all trees in the batch, plus `init` if
+        given."""
+        if self._use_host(X):
+            return self._predict_host(X, init)
+        if self._stores is None:
+            self._stores = (
+                get_store(self.leaf_value),
+                get_store(self.feature),
+                get_store(self.split_value),
+            )
+        return predict_trees(X, *self._stores, self.max_depth, init)
@@ -31,6 +31,9 @@ class BaseObjective(ABC):
     # utility constant
     one = cn.ones(1, dtype=cn.float64)
 
+    # True if transform returns its input unchanged, callers may skip it
+    is_identity_transform: bool = False
+
     @abstractmethod
     def gradient(self, y: cn.ndarray, pred: cn.ndarray) -> GradPair:
         """Computes the functional gradient and hessian of the squared error
@@ -96,6 +99,8 @@ class SquaredErrorObjective(BaseObjective):
         :class:`legateboost.metrics.MSEMetric`
     """
 
+    is_identity_transform = True
+
     def gradient(self, y: cn.ndarray, pred: cn.ndarray) -> GradPair:
         return pred - y, cn.ones(pred.shape)
 
@@ -406,6 +411,8 @@ class QuantileObjective(BaseObjective):
         :class:`legateboost.metrics.QuantileMetric`
     """  # noqa
 
+    is_identity_transform = True
+
     def __init__(self, quantiles: cn.ndarray = cn.array([0.25, 0.5, 0.75])) -> None:
         super().__init__()
         assert cn.all(0.0 < quantiles) and cn.all(quantiles < self.one)
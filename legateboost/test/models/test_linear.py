@@ -6,6 +6,7 @@ from sklearn.metrics import log_loss
 
 import cunumeric as cn
 import legateboost as lb
+from legateboost.models.linear import predict_linear_models
 
 
 @pytest.mark.parametrize("solver", ["direct", "lbfgs"])
@@ -108,3 +109,17 @@ class TestLinear:
             .fit(X, g, h)
         )
         assert not cn.any(cn.isnan(model.predict(X)))
+
+    def test_predict_linear_models(self, solver):
+        rs = cn.random.RandomState(0)
+        X = rs.random((20, 3))
+        g = rs.normal(size=(X.shape[0], 2))
+        h = cn.ones(g.shape)
+        models = [
+            lb.models.Linear(alpha=alpha, solver=solver)
+            .set_random_state(np.random.RandomState(0))
+            .fit(X, g, h)
+            for alpha in [0.1, 1.0, 10.0]
+        ]
+        expected = sum(m.predict(X) for m in models)
+        assert cn.allclose(predict_linear_models(models, X), expected)
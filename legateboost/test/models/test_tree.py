@@ -1,8 +1,12 @@
+import pickle
+
 import numpy as np
 import pytest
 
 import cunumeric as cn
 import legateboost as lb
+from legate.core import TaskTarget, get_legate_runtime
+from legateboost.models.tree import TreeBatch
 
 from ..utils import non_increasing
 from .utils import check_determinism
@@ -50,3 +54,118 @@ def test_alpha():
     )
     model.fit(X, y)
     assert model.predict(X)[0] == y.sum() / (y.size + alpha)
+
+
+def test_tree_batch():
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((100, 10)))
+    g = cn.array(rs.normal(size=(X.shape[0], 2)))
+    h = cn.array(rs.random(g.shape) + 0.1)
+    trees = [
+        lb.models.Tree(max_depth=max_depth).set_random_state(rs).fit(X, g, h)
+        for max_depth in [0, 3, 5]
+    ]
+    batch = TreeBatch(trees)
+    expected = trees[0].predict(X) + trees[1].predict(X) + trees[2].predict(X)
+    assert cn.allclose(batch.predict(X), expected)
+    # host and task predictions agree
+    batch.host_predict_size = 0
+    assert cn.allclose(batch.predict(X), expected)
+    assert cn.allclose(batch.predict(X, cn.ones(2)), expected + 1.0)
+    # X is wider than there are trees, the data read bounds the host path
+    batch.host_predict_size = X.shape[0] * len(trees)
+    assert not batch._use_host(X)
+    batch.host_predict_size = X.shape[0] * max(len(trees), X.shape[1])
+    on_gpu = get_legate_runtime().machine.count(TaskTarget.GPU) > 0
+    assert batch._use_host(X) != on_gpu
+    assert cn.allclose(batch.predict(X), expected)
+    assert cn.allclose(batch.predict(X, cn.ones(2)), expected + 1.0)
+
+    assert batch.matches(trees)
+    trees[1].clear()
+    assert not batch.matches(trees)
+    # a cleared tree keeps its structure, only its leaf values are copied
+    assert batch.update(trees) is batch
+    assert batch.matches(trees)
+    assert cn.allclose(batch.predict(X), trees[0].predict(X) + trees[2].predict(X))
+
+    # truncating or appending trees reuses the preallocated storage
+    batch = TreeBatch(trees, capacity=4)
+    assert batch.update(trees[:2]) is batch
+    assert batch.matches(trees[:2])
+    assert cn.allclose(batch.predict(X), trees[0].predict(X) + trees[1].predict(X))
+    assert batch.update(trees) is batch
+    assert batch.matches(trees)
+    assert cn.allclose(
+        batch.predict(X),
+        trees[0].predict(X) + trees[1].predict(X) + trees[2].predict(X),
+    )
+    assert batch.update(trees + trees) is not batch
+
+
+def test_pickle_after_predict():
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((100, 10)))
+    g = cn.array(rs.normal(size=(X.shape[0], 1)))
+    h = cn.ones_like(g)
+    tree = lb.models.Tree(max_depth=3).set_random_state(rs).fit(X, g, h)
+    pred = tree.predict(X)
+    loaded = pickle.loads(pickle.dumps(tree))
+    assert cn.allclose(loaded.predict(X), pred)
+
+
+def test_str():
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((200, 3)))
+    g = cn.array(rs.normal(size=(X.shape[0], 2)))
+    h = cn.ones_like(g)
+    tree = lb.models.Tree(max_depth=3).set_random_state(rs).fit(X, g, h)
+    feature = np.asarray(tree.feature)
+    leaf_value = np.asarray(tree.leaf_value)
+    hessian = np.asarray(tree.hessian)
+    assert feature[0] != -1
+
+    # depth first, left child before right child
+    def expected_nodes(id, depth):
+        if feature[id] == -1:
+            return [(id, depth)]
+        nodes = [(id, depth)]
+        nodes += expected_nodes(tree.left_child(id), depth + 1)
+        nodes += expected_nodes(tree.right_child(id), depth + 1)
+        return nodes
+
+    def format_vector(v):
+        return "[" + ",".join(["{:0.4f}".format(x) for x in v]) + "]"
+
+    text = str(tree)
+    assert text.endswith("\n")
+    lines = text.splitlines()
+    nodes = expected_nodes(0, 0)
+    assert len(lines) == len(nodes)
+    assert any(depth >= 2 for _, depth in nodes)
+    for line, (id, depth) in zip(lines, nodes):
+        assert line.startswith("\t" * depth + "{}:".format(id))
+        assert not line[depth:].startswith("\t")
+        if feature[id] == -1:
+            assert line == "\t" * depth + "{}:leaf={},hess={}".format(
+                id, format_vector(leaf_value[id]), format_vector(hessian[id])
+            )
+        else:
+            assert line.startswith(
+                "\t" * depth
+                + "{}:[f{}<={:0.4f}] yes={},no={},gain=".format(
+                    id,
+                    feature[id],
+                    float(tree.split_value[id]),
+                    2 * id + 1,
+                    2 * id + 2,
+                )
+            )
+            assert ",hess=" in line
+
+    model = lb.LBRegressor(
+        n_estimators=2, base_models=(lb.models.Tree(max_depth=2),), random_state=0
+    ).fit(X, g)
+    assert model.dump_models() == "init={}\n".format(model.model_init_) + "".join(
+        str(m) for m in model.models_
+    )
@@ -1,3 +1,5 @@
+import pickle
+
 import numpy as np
 import pytest
 from sklearn.datasets import make_regression
@@ -6,6 +8,7 @@ from sklearn.utils.estimator_checks import parametrize_with_checks
 
 import cunumeric as cn
 import legateboost as lb
+from legateboost.input_validation import check_X_y
 
 from .utils import non_increasing, sanity_check_models
 
@@ -207,3 +210,82 @@ def test_subsample():
             full_eval_result["train"]["mse"][-1]
             < subsample_eval_result["train"]["mse"][-1]
         )
+
+
+def test_non_finite_input():
+    # the sum of these values overflows, but each value is finite
+    X = cn.full((10, 2), 1e308)
+    y = cn.ones(X.shape[0])
+    lb.LBRegressor(n_estimators=2).fit(X, y)
+
+    X[0, 0] = cn.nan
+    with pytest.raises(ValueError, match="NaN or inf"):
+        lb.LBRegressor(n_estimators=2).fit(X, y)
+
+
+@pytest.mark.parametrize("dtype", [cn.int8, cn.int64, cn.float32, cn.float64])
+def test_label_dtype(dtype):
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((100, 3)))
+    y = cn.array(rs.randint(0, 5, X.shape[0])).astype(dtype)
+    assert check_X_y(X, y)[1].dtype == cn.float64
+    model = lb.LBRegressor(n_estimators=5, random_state=0).fit(X, y)
+    expected = lb.LBRegressor(n_estimators=5, random_state=0).fit(
+        X, y.astype(cn.float64)
+    )
+    assert cn.allclose(model.predict(X), expected.predict(X))
+
+
+@pytest.mark.parametrize("objective", ["squared_error", "quantile", "log_loss"])
+def test_float32_labels(objective):
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((1000, 3)))
+    if objective == "log_loss":
+        y = rs.randint(0, 2, X.shape[0])
+        estimator = lb.LBClassifier
+    else:
+        y = rs.normal(loc=1000.0, scale=0.1, size=X.shape[0])
+        estimator = lb.LBRegressor
+    y32 = cn.array(y.astype(np.float32))
+    model = estimator(n_estimators=5, objective=objective, random_state=0).fit(X, y32)
+    expected = estimator(n_estimators=5, objective=objective, random_state=0).fit(
+        X, y32.astype(cn.float64)
+    )
+    assert model.model_init_.dtype == cn.float64
+    assert cn.array_equal(model.model_init_, expected.model_init_)
+    assert cn.array_equal(model.predict(X), expected.predict(X))
+
+
+def test_float32_X_train_metric():
+    # training predictions match the batched prediction for float32 input
+    rs = np.random.RandomState(2)
+    X = cn.array(rs.random((100, 10)), dtype=cn.float32)
+    y = cn.array(rs.random(X.shape[0]))
+    eval_result = {}
+    model = lb.LBRegressor(n_estimators=20, random_state=2).fit(
+        X, y, eval_result=eval_result
+    )
+    loss_recomputed = model._metrics[0].metric(y, model.predict(X), cn.ones(y.shape[0]))
+    loss = next(iter(eval_result["train"].values()))
+    assert np.isclose(loss[-1], loss_recomputed)
+
+
+def test_pickle_reuses_tree_batch():
+    rs = np.random.RandomState(0)
+    X = cn.array(rs.random((100, 3)))
+    y = cn.array(rs.random(X.shape[0]))
+    model = lb.LBRegressor(n_estimators=5, random_state=0).fit(X, y)
+    loaded = pickle.loads(pickle.dumps(model))
+    batch = loaded._tree_batch
+    pred = loaded.predict(X)
+    assert loaded._tree_batch is batch
+    assert cn.allclose(loaded.predict(X), pred)
+    assert loaded._tree_batch is batch
+    assert cn.allclose(pred, model.predict(X))
+
+    # a batch outgrown by partial_fit is replaced once and then reused
+    loaded.partial_fit(X, y)
+    batch = loaded._tree_batch
+    assert batch.matches([m for m in loaded.models_ if isinstance(m, lb.models.Tree)])
+    loaded.predict(X)
+    assert loaded._tree_batch is batch
@@ -127,3 +127,23 @@ def test_exp():
             ),
             False,
         )
+
+
+@pytest.mark.parametrize(
+    "name,expected",
+    [
+        ("squared_error", True),
+        ("normal", False),
+        ("log_loss", False),
+        ("exp", False),
+        ("quantile", True),
+        ("gamma_deviance", False),
+        ("gamma", False),
+    ],
+)
+def test_identity_transform(name, expected) -> None:
+    obj = lb.objectives.objectives[name]()
+    assert obj.is_identity_transform == expected
+    if expected:
+        pred = cn.array([[-1.0, 0.5, 2.0], [0.0, 1.0, 3.0]])
+        assert obj.transform(pred) is pred
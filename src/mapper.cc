@@ -40,15 +40,7 @@ std::vector<legate::mapping::StoreMapping> LegateboostMapper::store_mappings(
   auto task_id = task.task_id();
   switch (task_id) {
     case GATHER:
-    case PREDICT: {
-      std::vector<legate::mapping::StoreMapping> mappings;
-      auto input_x = task.input(0);
-      mappings.push_back(
-        legate::mapping::StoreMapping::default_mapping(input_x.data(), options.front()));
-      mappings.back().policy().ordering.set_c_order();
-      mappings.back().policy().exact = true;
-      return std::move(mappings);
-    }
+    case PREDICT:
     case BUILD_TREE: {
       std::vector<legate::mapping::StoreMapping> mappings;
       auto input_x = task.input(0);
@@ -56,11 +48,6 @@ std::vector<legate::mapping::StoreMapping> LegateboostMapper::store_mappings(
         legate::mapping::StoreMapping::default_mapping(input_x.data(), options.front()));
       mappings.back().policy().ordering.set_c_order();
       mappings.back().policy().exact = true;
-      auto input_splits              = task.input(3);
-      mappings.push_back(
-        legate::mapping::StoreMapping::default_mapping(input_splits.data(), options.front()));
-      mappings.back().policy().ordering.set_c_order();
-      mappings.back().policy().exact = true;
       return std::move(mappings);
     }
     default: {
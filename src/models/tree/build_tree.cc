@@ -13,6 +13,8 @@
  * limitations under the License.
  *
  */
+#include <algorithm>
+#include <limits>
 #include "legate.h"
 #include "legate_library.h"
 #include "legateboost.h"
@@ -115,36 +117,63 @@ struct TreeBuilder {
       samples_per_feature(samples_per_feature),
       histogram_buffer(legate::create_buffer<GPair, 4>(
         {max_nodes, num_features, num_outputs, samples_per_feature})),
-      positions(num_rows, 0)
+      positions(num_rows, 0),
+      split_bin(max_nodes, -1)
   {
     auto ptr = histogram_buffer.ptr({0, 0, 0, 0});
     std::fill(
       ptr, ptr + max_nodes * num_features * num_outputs * samples_per_feature, GPair{0.0, 0.0});
   }
   ~TreeBuilder() { histogram_buffer.destroy(); }
-  template <typename TYPE>
+  // Map each feature value to the index of its split proposal bin
+  // Done once per tree, instead of searching the split proposals at every depth
+  // A bin index equal to samples_per_feature means the value is above all proposals
+  template <typename TYPE, typename BinT>
+  legate::Buffer<BinT, 2> QuantiseFeatures(legate::AccessorRO<TYPE, 3> X,
+                                           legate::Rect<3> X_shape,
+                                           legate::Buffer<TYPE, 2> split_proposal)
+  {
+    auto bins =
+      legate::create_buffer<BinT, 2>({std::max<int64_t>(num_rows, 1), std::max(num_features, 1)});
+    for (int64_t i = X_shape.lo[0]; i <= X_shape.hi[0]; i++) {
+      for (int64_t j = 0; j < num_features; j++) {
+        auto x_value = X[{i, j, 0}];
+        bins[{i - X_shape.lo[0], j}] =
+          std::lower_bound(
+            split_proposal.ptr({j, 0}), split_proposal.ptr({j, 0}) + samples_per_feature, x_value) -
+          split_proposal.ptr({j, 0});
+      }
+    }
+    return bins;
+  }
+
+  template <typename BinT>
   void ComputeHistogram(int depth,
                         legate::TaskContext context,
                         Tree& tree,
-                        legate::AccessorRO<TYPE, 3> X,
+                        legate::Buffer<BinT, 2> bins,
                         legate::Rect<3> X_shape,
-                        legate::AccessorRO<TYPE, 2> split_proposal,
                         legate::AccessorRO<double, 3> g,
                         legate::AccessorRO<double, 3> h)
   {
-    // Build the histogram
+    // Move each row to its node at this depth and build the histogram in a
+    // single pass over the rows
     for (int64_t i = X_shape.lo[0]; i <= X_shape.hi[0]; i++) {
       auto index_local = i - X_shape.lo[0];
-      auto position    = positions[index_local];
-      bool compute     = ComputeHistogramBin(position, depth, tree.hessian);
+      int& position    = positions[index_local];
+      if (depth > 0 && position >= 0) {
+        if (tree.IsLeaf(position)) {
+          position = -1;
+        } else {
+          // x <= split_proposal[best_bin] is equivalent to bin(x) <= best_bin
+          bool left = bins[{index_local, tree.feature[position]}] <= split_bin[position];
+          position  = left ? BinaryTree::LeftChild(position) : BinaryTree::RightChild(position);
+        }
+      }
+      bool compute = ComputeHistogramBin(position, depth, tree.hessian);
       if (position < 0 || !compute) continue;
       for (int64_t j = 0; j < num_features; j++) {
-        auto x_value = X[{i, j, 0}];
-        int bin_idx =
-          std::lower_bound(
-            split_proposal.ptr({j, 0}), split_proposal.ptr({j, samples_per_feature}), x_value) -
-          split_proposal.ptr({j, 0});
-
+        int bin_idx = bins[{index_local, j}];
         if (bin_idx < samples_per_feature) {
           for (int64_t k = 0; k < num_outputs; ++k) {
             histogram_buffer[{position, j, k, bin_idx}] += GPair{g[{i, 0, k}], h[{i, 0, k}]};
@@ -202,10 +231,7 @@ struct TreeBuilder {
     }
   }
   template <typename TYPE>
-  void PerformBestSplit(int depth,
-                        Tree& tree,
-                        legate::AccessorRO<TYPE, 2> split_proposal,
-                        double alpha)
+  void PerformBestSplit(int depth, Tree& tree, legate::Buffer<TYPE, 2> split_proposal, double alpha)
   {
     for (int node_id = BinaryTree::LevelBegin(depth); node_id < BinaryTree::LevelBegin(depth + 1);
          node_id++) {
@@ -253,6 +279,7 @@ struct TreeBuilder {
           hessian_right[output]  = H_R;
         }
         if (hessian_left[0] <= 0.0 || hessian_right[0] <= 0.0) continue;
+        split_bin[node_id] = best_bin;
         tree.AddSplit(node_id,
                       best_feature,
                       split_proposal[{best_feature, best_bin}],
@@ -266,27 +293,6 @@ struct TreeBuilder {
       }
     }
   }
-  template <typename TYPE>
-  void UpdatePositions(int depth,
-                       Tree& tree,
-                       legate::AccessorRO<TYPE, 3> X,
-                       legate::Rect<3> X_shape)
-  {
-    if (depth == 0) return;
-    // Update the positions
-    for (int64_t i = X_shape.lo[0]; i <= X_shape.hi[0]; i++) {
-      auto index_local = i - X_shape.lo[0];
-      int& pos         = positions[index_local];
-      if (pos < 0 || tree.IsLeaf(pos)) {
-        pos = -1;
-        continue;
-      }
-      auto x    = X[{i, tree.feature[pos], 0}];
-      bool left = x <= tree.split_value[pos];
-      pos       = left ? BinaryTree::LeftChild(pos) : BinaryTree::RightChild(pos);
-    }
-  }
-
   void InitialiseRoot(legate::TaskContext context,
                       Tree& tree,
                       legate::AccessorRO<double, 3> g_accessor,
@@ -310,6 +316,7 @@ struct TreeBuilder {
   }
 
   std::vector<int32_t> positions;
+  std::vector<int32_t> split_bin;
   const int32_t num_rows;
   const int32_t num_features;
   const int32_t num_outputs;
@@ -318,6 +325,31 @@ struct TreeBuilder {
   legate::Buffer<GPair, 4> histogram_buffer;
 };
 
+// Gather the sampled rows of X into a (feature, sample) buffer sorted by value
+// Each worker fills in the rows it owns and the partial results are summed
+template <typename T>
+legate::Buffer<T, 2> GatherSplitProposals(legate::TaskContext context,
+                                          legate::AccessorRO<T, 3> X,
+                                          legate::Rect<3> X_shape,
+                                          const int64_t* sample_rows,
+                                          int64_t n_samples)
+{
+  auto num_features    = X_shape.hi[1] - X_shape.lo[1] + 1;
+  auto split_proposals = legate::create_buffer<T, 2>({num_features, n_samples});
+  for (int64_t j = 0; j < num_features; j++) {
+    for (int64_t i = 0; i < n_samples; i++) {
+      auto row                = sample_rows[i];
+      bool has_data           = row >= X_shape.lo[0] && row <= X_shape.hi[0];
+      split_proposals[{j, i}] = has_data ? X[{row, j, 0}] : T(0);
+    }
+  }
+  SumAllReduce(context, split_proposals.ptr({0, 0}), num_features * n_samples);
+  for (int64_t j = 0; j < num_features; j++) {
+    std::sort(split_proposals.ptr({j, 0}), split_proposals.ptr({j, 0}) + n_samples);
+  }
+  return split_proposals;
+}
+
 struct build_tree_fn {
   template <typename T>
   void operator()(legate::TaskContext context)
@@ -325,44 +357,55 @@ struct build_tree_fn {
     auto [X, X_shape, X_accessor] = GetInputStore<T, 3>(context.input(0).data());
     auto [g, g_shape, g_accessor] = GetInputStore<double, 3>(context.input(1).data());
     auto [h, h_shape, h_accessor] = GetInputStore<double, 3>(context.input(2).data());
-    auto [split_proposals, split_proposals_shape, split_proposals_accessor] =
-      GetInputStore<T, 2>(context.input(3).data());
     EXPECT_DENSE_ROW_MAJOR(X_accessor.accessor, X_shape);
-    EXPECT_DENSE_ROW_MAJOR(split_proposals_accessor.accessor, split_proposals_shape);
     auto num_features = X_shape.hi[1] - X_shape.lo[1] + 1;
     auto num_rows     = std::max<int64_t>(X_shape.hi[0] - X_shape.lo[0] + 1, 0);
     EXPECT_AXIS_ALIGNED(0, X_shape, g_shape);
     EXPECT_AXIS_ALIGNED(0, g_shape, h_shape);
     EXPECT_AXIS_ALIGNED(1, g_shape, h_shape);
     auto num_outputs = g.shape<3>().hi[2] - g.shape<3>().lo[2] + 1;
-    EXPECT_IS_BROADCAST(split_proposals_shape);
-    auto samples_per_feature = split_proposals_shape.hi[1] - split_proposals_shape.lo[1] + 1;
     EXPECT(g_shape.lo[2] == 0, "Expect all outputs to be present");
 
     // Scalars
-    auto max_depth = context.scalars().at(0).value<int>();
-    auto max_nodes = context.scalars().at(1).value<int>();
-    auto alpha     = context.scalars().at(2).value<double>();
+    auto max_depth   = context.scalars().at(0).value<int>();
+    auto max_nodes   = context.scalars().at(1).value<int>();
+    auto alpha       = context.scalars().at(2).value<double>();
+    auto sample_rows = context.scalar(3).values<int64_t>();
+
+    // Split candidates are the values of X at the sampled rows
+    int64_t samples_per_feature = sample_rows.size();
+    auto split_proposals =
+      GatherSplitProposals(context, X_accessor, X_shape, &sample_rows[0], samples_per_feature);
 
     Tree tree(max_nodes, num_outputs);
     // Begin building the tree
     TreeBuilder tree_builder(num_rows, num_features, num_outputs, max_nodes, samples_per_feature);
     tree_builder.InitialiseRoot(context, tree, g_accessor, h_accessor, g_shape, alpha);
-    for (int64_t depth = 0; depth < max_depth; ++depth) {
-      tree_builder.UpdatePositions(depth, tree, X_accessor, X_shape);
 
-      tree_builder.ComputeHistogram(depth,
-                                    context,
-                                    tree,
-                                    X_accessor,
-                                    X_shape,
-                                    split_proposals_accessor,
-                                    g_accessor,
-                                    h_accessor);
-      tree_builder.PerformBestSplit(depth, tree, split_proposals_accessor, alpha);
+    auto build = [&](auto bin_type) {
+      using BinT = decltype(bin_type);
+      auto bins =
+        tree_builder.template QuantiseFeatures<T, BinT>(X_accessor, X_shape, split_proposals);
+      for (int64_t depth = 0; depth < max_depth; ++depth) {
+        tree_builder.ComputeHistogram(depth, context, tree, bins, X_shape, g_accessor, h_accessor);
+        tree_builder.PerformBestSplit(depth, tree, split_proposals, alpha);
+      }
+      bins.destroy();
+    };
+
+    // Use the narrowest type that holds every bin index. Indices run over
+    // [0, samples_per_feature], the last meaning above all proposals, so the
+    // default of 256 split samples needs uint16_t
+    if (samples_per_feature <= std::numeric_limits<uint8_t>::max()) {
+      build(uint8_t{});
+    } else if (samples_per_feature <= std::numeric_limits<uint16_t>::max()) {
+      build(uint16_t{});
+    } else {
+      build(int32_t{});
     }
 
     WriteTreeOutput(context, tree);
+    split_proposals.destroy();
   }
 };
 
@@ -72,7 +72,7 @@ __global__ static void __launch_bounds__(THREADS_PER_BLOCK, MIN_CTAS_PER_SM)
                  legate::AccessorRO<double, 3> g,
                  legate::AccessorRO<double, 3> h,
                  size_t n_outputs,
-                 legate::AccessorRO<TYPE, 2> split_proposal,
+                 legate::Buffer<TYPE, 2> split_proposal,
                  int32_t samples_per_feature,
                  int32_t* positions_local,
                  legate::Buffer<GPair, 4> histogram,
@@ -109,7 +109,7 @@ __global__ static void __launch_bounds__(THREADS_PER_BLOCK, MIN_CTAS_PER_SM)
           auto x_value = X[{globalSampleId, feature, 0}];
           int bin_idx  = thrust::lower_bound(thrust::seq,
                                             split_proposal.ptr({feature, 0}),
-                                            split_proposal.ptr({feature, samples_per_feature}),
+                                            split_proposal.ptr({feature, 0}) + samples_per_feature,
                                             x_value) -
                         split_proposal.ptr({feature, 0});
 
@@ -223,7 +223,7 @@ __global__ static void __launch_bounds__(THREADS_PER_BLOCK, MIN_CTAS_PER_SM)
   perform_best_split(legate::Buffer<GPair, 4> histogram,
                      size_t n_features,
                      size_t n_outputs,
-                     legate::AccessorRO<TYPE, 2> split_proposal,
+                     legate::Buffer<TYPE, 2> split_proposal,
                      int32_t samples_per_feature,
                      double eps,
                      double alpha,
@@ -465,7 +465,7 @@ struct TreeBuilder {
                         Tree& tree,
                         legate::AccessorRO<TYPE, 3> X,
                         legate::Rect<3> X_shape,
-                        legate::AccessorRO<TYPE, 2> split_proposal,
+                        legate::Buffer<TYPE, 2> split_proposal,
                         legate::AccessorRO<double, 3> g,
                         legate::AccessorRO<double, 3> h)
   {
@@ -516,10 +516,7 @@ struct TreeBuilder {
   }
 
   template <typename TYPE>
-  void PerformBestSplit(int depth,
-                        Tree& tree,
-                        legate::AccessorRO<TYPE, 2> split_proposal,
-                        double alpha)
+  void PerformBestSplit(int depth, Tree& tree, legate::Buffer<TYPE, 2> split_proposal, double alpha)
   {
     perform_best_split<<<BinaryTree::NodesInLevel(depth), THREADS_PER_BLOCK, 0, stream>>>(
       histogram_buffer,
@@ -578,6 +575,51 @@ struct TreeBuilder {
   cudaStream_t stream;
 };
 
+// Gather the sampled rows of X into a (feature, sample) buffer sorted by value
+// Each worker fills in the rows it owns and the partial results are summed
+template <typename T, typename ThrustPolicyT>
+legate::Buffer<T, 2> GatherSplitProposals(legate::TaskContext context,
+                                          legate::AccessorRO<T, 3> X,
+                                          legate::Rect<3> X_shape,
+                                          const int64_t* sample_rows_host,
+                                          int64_t n_samples,
+                                          cudaStream_t stream,
+                                          ThrustPolicyT thrust_exec_policy)
+{
+  auto num_features = X_shape.hi[1] - X_shape.lo[1] + 1;
+  auto n            = num_features * n_samples;
+  auto sample_rows  = legate::create_buffer<int64_t, 1>(n_samples);
+  CHECK_CUDA(cudaMemcpyAsync(sample_rows.ptr(0),
+                             sample_rows_host,
+                             n_samples * sizeof(int64_t),
+                             cudaMemcpyHostToDevice,
+                             stream));
+  auto split_proposals = legate::create_buffer<T, 2>({num_features, n_samples});
+  auto feature_keys    = legate::create_buffer<int64_t, 1>(n);
+  LaunchN(n, stream, [=] __device__(size_t idx) {
+    int64_t j               = idx / n_samples;
+    int64_t i               = idx % n_samples;
+    auto row                = sample_rows[i];
+    bool has_data           = row >= X_shape.lo[0] && row <= X_shape.hi[0];
+    split_proposals[{j, i}] = has_data ? X[{row, j, 0}] : T(0);
+    feature_keys[idx]       = j;
+  });
+
+  SumAllReduce(context, split_proposals.ptr({0, 0}), n, stream);
+
+  // Segmented sort: sort all values, then stable sort by feature to restore the segments
+  thrust::sort_by_key(thrust_exec_policy,
+                      split_proposals.ptr({0, 0}),
+                      split_proposals.ptr({0, 0}) + n,
+                      feature_keys.ptr(0));
+  thrust::stable_sort_by_key(
+    thrust_exec_policy, feature_keys.ptr(0), feature_keys.ptr(0) + n, split_proposals.ptr({0, 0}));
+  CHECK_CUDA_STREAM(stream);
+  sample_rows.destroy();
+  feature_keys.destroy();
+  return split_proposals;
+}
+
 struct build_tree_fn {
   template <typename T>
   void operator()(legate::TaskContext context)
@@ -585,10 +627,7 @@ struct build_tree_fn {
     auto [X, X_shape, X_accessor] = GetInputStore<T, 3>(context.input(0).data());
     auto [g, g_shape, g_accessor] = GetInputStore<double, 3>(context.input(1).data());
     auto [h, h_shape, h_accessor] = GetInputStore<double, 3>(context.input(2).data());
-    auto [split_proposals, split_proposals_shape, split_proposals_accessor] =
-      GetInputStore<T, 2>(context.input(3).data());
     EXPECT_DENSE_ROW_MAJOR(X_accessor.accessor, X_shape);
-    EXPECT_DENSE_ROW_MAJOR(split_proposals_accessor.accessor, split_proposals_shape);
     auto num_features = X_shape.hi[1] - X_shape.lo[1] + 1;
     auto num_rows     = std::max<int64_t>(X_shape.hi[0] - X_shape.lo[0] + 1, 0);
     auto num_outputs  = X_shape.hi[2] - X_shape.lo[2] + 1;
@@ -596,18 +635,27 @@ struct build_tree_fn {
     EXPECT_AXIS_ALIGNED(0, X_shape, g_shape);
     EXPECT_AXIS_ALIGNED(0, g_shape, h_shape);
     EXPECT_AXIS_ALIGNED(1, g_shape, h_shape);
-    EXPECT_IS_BROADCAST(split_proposals_shape);
-    auto samples_per_feature = split_proposals_shape.hi[1] - split_proposals_shape.lo[1] + 1;
 
     // Scalars
-    auto max_depth = context.scalars().at(0).value<int>();
-    auto max_nodes = context.scalars().at(1).value<int>();
-    auto alpha     = context.scalars().at(2).value<double>();
+    auto max_depth   = context.scalars().at(0).value<int>();
+    auto max_nodes   = context.scalars().at(1).value<int>();
+    auto alpha       = context.scalars().at(2).value<double>();
+    auto sample_rows = context.scalar(3).values<int64_t>();
 
     auto stream             = legate::cuda::StreamPool::get_stream_pool().get_stream();
     auto thrust_alloc       = ThrustAllocator(legate::Memory::GPU_FB_MEM);
     auto thrust_exec_policy = DEFAULT_POLICY(thrust_alloc).on(stream);
 
+    // Split candidates are the values of X at the sampled rows
+    int64_t samples_per_feature = sample_rows.size();
+    auto split_proposals        = GatherSplitProposals(context,
+                                                X_accessor,
+                                                X_shape,
+                                                &sample_rows[0],
+                                                samples_per_feature,
+                                                stream,
+                                                thrust_exec_policy);
+
     Tree tree(max_nodes, num_outputs, stream, thrust_exec_policy);
 
     // Begin building the tree
@@ -621,23 +669,18 @@ struct build_tree_fn {
       builder.UpdatePositions(depth, tree, X_accessor, X_shape);
 
       // actual histogram creation
-      builder.ComputeHistogram(depth,
-                               context,
-                               tree,
-                               X_accessor,
-                               X_shape,
-                               split_proposals_accessor,
-                               g_accessor,
-                               h_accessor);
+      builder.ComputeHistogram(
+        depth, context, tree, X_accessor, X_shape, split_proposals, g_accessor, h_accessor);
 
       // Select the best split
-      builder.PerformBestSplit(depth, tree, split_proposals_accessor, alpha);
+      builder.PerformBestSplit(depth, tree, split_proposals, alpha);
     }
 
     tree.WriteTreeOutput(context, thrust_exec_policy);
 
     CHECK_CUDA(cudaStreamSynchronize(stream));
     CHECK_CUDA_STREAM(stream);
+    split_proposals.destroy();
   }
 };
 
@@ -28,9 +28,12 @@ struct predict_fn {
     auto X_accessor = X.read_accessor<T, 3>();
     EXPECT_DENSE_ROW_MAJOR(X_accessor.accessor, X_shape);
 
-    auto leaf_value  = context.input(1).data().read_accessor<double, 2>();
-    auto feature     = context.input(2).data().read_accessor<int32_t, 1>();
-    auto split_value = context.input(3).data().read_accessor<double, 1>();
+    // A stack of trees, their predictions are summed
+    auto leaf_value  = context.input(1).data().read_accessor<double, 3>();
+    auto feature     = context.input(2).data().read_accessor<int32_t, 2>();
+    auto split_value = context.input(3).data().read_accessor<double, 2>();
+    auto tree_shape  = context.input(2).data().shape<2>();
+    auto n_trees     = tree_shape.hi[0] - tree_shape.lo[0] + 1;
 
     auto pred          = context.output(0).data();
     auto pred_shape    = pred.shape<3>();
@@ -40,20 +43,40 @@ struct predict_fn {
     EXPECT_AXIS_ALIGNED(0, X_shape, pred_shape);
 
     // We should have the whole tree
-    EXPECT_IS_BROADCAST(context.input(1).data().shape<2>());
-    EXPECT_IS_BROADCAST(context.input(2).data().shape<1>());
-    EXPECT_IS_BROADCAST(context.input(3).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(1).data().shape<3>());
+    EXPECT_IS_BROADCAST(context.input(2).data().shape<2>());
+    EXPECT_IS_BROADCAST(context.input(3).data().shape<2>());
 
+    auto max_depth = context.scalars().at(0).value<int32_t>();
+
+    // Optional initial prediction, the sum of the trees is added to it
+    std::vector<double> init(pred_shape.hi[2] - pred_shape.lo[2] + 1, 0.0);
+    if (context.scalars().size() > 1) {
+      auto init_span = context.scalar(1).values<double>();
+      EXPECT(init_span.size() == init.size(), "Expect one initial value per output");
+      std::copy(init_span.begin(), init_span.end(), init.begin());
+    }
+
+    std::vector<double> sum(init.size());
     for (int64_t i = X_shape.lo[0]; i <= X_shape.hi[0]; i++) {
-      int pos = 0;
-      // Use a max depth of 100 to avoid infinite loops
-      for (int depth = 0; depth < 100; depth++) {
-        if (feature[pos] == -1) break;
-        auto x = X_accessor[{i, feature[pos], 0}];
-        pos    = x <= split_value[pos] ? pos * 2 + 1 : pos * 2 + 2;
+      std::copy(init.begin(), init.end(), sum.begin());
+      for (int64_t t = 0; t < n_trees; t++) {
+        int pos = 0;
+        // Fixed trip count traversal without a leaf branch
+        // Leaves are absorbing: a row that reaches a leaf early keeps its position
+        for (int depth = 0; depth < max_depth; depth++) {
+          int32_t f = feature[{t, pos}];
+          bool leaf = f == -1;
+          auto x    = X_accessor[{i, leaf ? 0 : f, 0}];
+          int child = pos * 2 + 1 + static_cast<int>(!(x <= split_value[{t, pos}]));
+          pos       = leaf ? pos : child;
+        }
+        for (int64_t j = pred_shape.lo[2]; j <= pred_shape.hi[2]; j++) {
+          sum[j - pred_shape.lo[2]] += leaf_value[{t, pos, j}];
+        }
       }
       for (int64_t j = pred_shape.lo[2]; j <= pred_shape.hi[2]; j++) {
-        pred_accessor[{i, 0, j}] = leaf_value[{pos, j}];
+        pred_accessor[{i, 0, j}] = sum[j - pred_shape.lo[2]];
       }
     }
   }
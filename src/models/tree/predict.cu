@@ -32,9 +32,12 @@ struct predict_fn {
     auto X_accessor = X.read_accessor<T, 3>();
     EXPECT_DENSE_ROW_MAJOR(X_accessor.accessor, X_shape);
 
-    auto leaf_value  = context.input(1).data().read_accessor<double, 2>();
-    auto feature     = context.input(2).data().read_accessor<int32_t, 1>();
-    auto split_value = context.input(3).data().read_accessor<double, 1>();
+    // A stack of trees, their predictions are summed
+    auto leaf_value  = context.input(1).data().read_accessor<double, 3>();
+    auto feature     = context.input(2).data().read_accessor<int32_t, 2>();
+    auto split_value = context.input(3).data().read_accessor<double, 2>();
+    auto tree_shape  = context.input(2).data().shape<2>();
+    auto n_trees     = tree_shape.hi[0] - tree_shape.lo[0] + 1;
 
     auto pred          = context.output(0).data();
     auto pred_shape    = pred.shape<3>();
@@ -46,31 +49,58 @@ struct predict_fn {
     EXPECT_AXIS_ALIGNED(0, X_shape, pred_shape);
 
     // We should have the whole tree
-    EXPECT_IS_BROADCAST(context.input(1).data().shape<2>());
-    EXPECT_IS_BROADCAST(context.input(2).data().shape<1>());
-    EXPECT_IS_BROADCAST(context.input(3).data().shape<1>());
+    EXPECT_IS_BROADCAST(context.input(1).data().shape<3>());
+    EXPECT_IS_BROADCAST(context.input(2).data().shape<2>());
+    EXPECT_IS_BROADCAST(context.input(3).data().shape<2>());
 
-    // rowwise kernel
-    auto prediction_lambda = [=] __device__(size_t idx) {
-      int64_t pos              = 0;
-      legate::Point<3> x_point = {X_shape.lo[0] + (int64_t)idx, 0, 0};
+    auto max_depth = context.scalars().at(0).value<int32_t>();
 
-      // Use a max depth of 100 to avoid infinite loops
-      for (int depth = 0; depth < 100; depth++) {
-        if (feature[pos] == -1) break;
-        x_point[1]   = feature[pos];
-        double X_val = X_accessor[x_point];
-        pos          = X_val <= split_value[pos] ? pos * 2 + 1 : pos * 2 + 2;
-      }
-      for (int64_t j = 0; j < n_outputs; j++) {
-        pred_accessor[{X_shape.lo[0] + (int64_t)idx, 0, j}] = leaf_value[{pos, j}];
+    auto stream = legate::cuda::StreamPool::get_stream_pool().get_stream();
+
+    // Optional initial prediction, the sum of the trees is added to it
+    bool has_init = context.scalars().size() > 1;
+    auto init     = legate::create_buffer<double, 1>(n_outputs);
+    if (has_init) {
+      auto init_span = context.scalar(1).values<double>();
+      EXPECT(static_cast<int64_t>(init_span.size()) == n_outputs,
+             "Expect one initial value per output");
+      CHECK_CUDA(cudaMemcpyAsync(
+        init.ptr(0), &init_span[0], n_outputs * sizeof(double), cudaMemcpyHostToDevice, stream));
+    }
+
+    // One thread per row, each tree is traversed once and its leaf values
+    // accumulated for every output in double. Sums are stored output-major so
+    // that neighbouring threads access neighbouring memory.
+    auto n_rows = std::max<int64_t>(X_shape.hi[0] - X_shape.lo[0] + 1, 0);
+    auto sums   = legate::create_buffer<double, 2>(
+      {std::max<int64_t>(n_outputs, 1), std::max<int64_t>(n_rows, 1)});
+    auto prediction_lambda = [=] __device__(size_t idx) {
+      int64_t row              = X_shape.lo[0] + static_cast<int64_t>(idx);
+      int64_t local            = static_cast<int64_t>(idx);
+      legate::Point<3> x_point = {row, 0, 0};
+      for (int64_t j = 0; j < n_outputs; j++) { sums[{j, local}] = has_init ? init[j] : 0.0; }
+      for (int64_t t = 0; t < n_trees; t++) {
+        int64_t pos = 0;
+        // Fixed trip count traversal without a leaf branch
+        // Leaves are absorbing: a row that reaches a leaf early keeps its position
+        for (int depth = 0; depth < max_depth; depth++) {
+          int32_t f     = feature[{t, pos}];
+          bool leaf     = f == -1;
+          x_point[1]    = leaf ? 0 : f;
+          double X_val  = X_accessor[x_point];
+          int64_t child = pos * 2 + 1 + static_cast<int64_t>(!(X_val <= split_value[{t, pos}]));
+          pos           = leaf ? pos : child;
+        }
+        for (int64_t j = 0; j < n_outputs; j++) { sums[{j, local}] += leaf_value[{t, pos, j}]; }
       }
+      for (int64_t j = 0; j < n_outputs; j++) { pred_accessor[{row, 0, j}] = sums[{j, local}]; }
     };
 
-    auto stream = legate::cuda::StreamPool::get_stream_pool().get_stream();
-    LaunchN(X_shape.hi[0] - X_shape.lo[0] + 1, stream, prediction_lambda);
+    LaunchN(n_rows, stream, prediction_lambda);
 
     CHECK_CUDA_STREAM(stream);
+    init.destroy();
+    sums.destroy();
   }
 };
 }  // namespace